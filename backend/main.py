@@ -535,6 +535,13 @@ async def startup_event():
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write any queued chunks and close the database"""
+    if vector_store:
+        logger.info("Closing vector store...")
+        vector_store.close()
+
 @app.get("/")
 async def root():
     return {"message": "SmartFile AI Backend is running", "status": "healthy"}
@@ -619,7 +626,8 @@ async def search_files(request: SearchRequest):
         results = await vector_store.search(
             query=request.query,
             limit=request.limit or 10,
-            threshold=request.threshold or 0.3  # Very low threshold for better results
+            threshold=request.threshold or 0.3,  # Very low threshold for better results
+            folder_id=request.folder_id
         )
 
         logger.info(f"Search completed: {len(results)} results found")
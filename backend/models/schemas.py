@@ -8,6 +8,7 @@ class SearchRequest(BaseModel):
     query: str
     limit: Optional[int] = 10
     threshold: Optional[float] = 0.7
+    folder_id: Optional[int] = None
 
 class QueryRequest(BaseModel):
     question: str
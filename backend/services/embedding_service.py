@@ -57,6 +57,9 @@ from typing import List
 import logging
 import traceback
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 logger = logging.getLogger(__name__)
 
@@ -65,6 +68,9 @@ class EmbeddingService:
         """Initialize the embedding service with a sentence transformer model"""
         self.model_name = model_name
         self.model = None
+        # encode() is CPU-bound and blocking, so it runs here instead of on the event loop.
+        # One worker: torch already uses every core for a single encode call.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
         self._load_model()
 
     def _load_model(self):
@@ -109,7 +115,7 @@ class EmbeddingService:
             logger.debug(f"Generating embedding for text (length: {len(text)}): '{text[:100]}{'...' if len(text) > 100 else ''}'")
 
             # Generate embedding
-            embedding = self.model.encode(text, convert_to_numpy=True)
+            embedding = await self._encode(text)
 
             # Validate embedding
             if embedding is None or len(embedding) == 0:
@@ -142,7 +148,7 @@ class EmbeddingService:
                 else:
                     cleaned_texts.append("empty content")
 
-            embeddings = self.model.encode(cleaned_texts, convert_to_numpy=True)
+            embeddings = await self._encode(cleaned_texts)
             result = [emb.astype(np.float32) for emb in embeddings]
 
             logger.info(f"Generated {len(result)} embeddings")
@@ -153,6 +159,11 @@ class EmbeddingService:
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
+    async def _encode(self, texts):
+        """Run model.encode on the embedding worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(self.model.encode, texts, convert_to_numpy=True))
+
     def get_embedding_dimension(self) -> int:
         """Get the dimension of the embeddings"""
         if not self.model:
@@ -152,7 +152,6 @@ from datetime import datetime
 import traceback
 
 from .vector_store import VectorStore
-from .embedding_service import EmbeddingService
 from .file_processors import FileProcessorFactory
 
 logger = logging.getLogger(__name__)
@@ -160,7 +159,8 @@ logger = logging.getLogger(__name__)
 class FileIndexer:
     def __init__(self, vector_store: VectorStore):
         self.vector_store = vector_store
-        self.embedding_service = EmbeddingService()
+        # Share the store's model instead of loading a second copy
+        self.embedding_service = vector_store.embedding_service
         self.supported_extensions = {
             '.txt', '.md', '.py', '.js', '.html', '.css', '.json',
             '.pdf', '.docx', '.doc', '.rtf', '.odt', '.xml', '.yaml', '.yml','.c'
@@ -203,6 +203,8 @@ class FileIndexer:
         logger.info(f"📁 Added folder to database with ID: {folder_id}")
 
         processed_count = 0
+        # Re-indexing updates rows in place, so files gone from disk are removed afterwards
+        seen_paths = []
 
         try:
             for root, dirs, files in os.walk(folder_path):
@@ -212,6 +214,7 @@ class FileIndexer:
                     file_path = Path(root) / file_name
 
                     if file_path.suffix.lower() in self.supported_extensions:
+                        seen_paths.append(str(file_path))
                         try:
                             logger.info(f"📄 Processing file: {file_path}")
                             await self._index_file(folder_id, file_path)
@@ -232,6 +235,8 @@ class FileIndexer:
             logger.error(f"❌ Error walking directory {folder_path}: {str(e)}")
             raise
 
+        await self.vector_store.prune_folder_files(folder_id, seen_paths)
+
         logger.info(f"✅ Completed indexing folder {folder_path}: {processed_count} files processed")
 
     async def _index_file(self, folder_id: int, file_path: Path):
@@ -241,20 +246,18 @@ class FileIndexer:
 
             # Get file info
             stat = file_path.stat()
+            # Hashing reads the whole file; keep that disk I/O off the event loop
+            file_hash = await asyncio.get_running_loop().run_in_executor(None, self._calculate_file_hash, file_path)
             file_info = {
                 'name': file_path.name,
                 'type': file_path.suffix.lower(),
                 'size': stat.st_size,
                 'modified': datetime.fromtimestamp(stat.st_mtime),
-                'hash': self._calculate_file_hash(file_path)
+                'hash': file_hash
             }
 
             logger.debug(f"📊 File info: {file_info}")
 
-            # Add file to database
-            file_id = await self.vector_store.add_file(folder_id, str(file_path), file_info)
-            logger.debug(f"📄 Added file to database with ID: {file_id}")
-
             # Extract text content
             processor = FileProcessorFactory.get_processor(file_path.suffix.lower())
             logger.debug(f"🔧 Using processor: {type(processor).__name__}")
@@ -263,6 +266,9 @@ class FileIndexer:
 
             if not content or not content.strip():
                 logger.warning(f"⚠️ No content extracted from {file_path}")
+                # Still record the file so it shows up as indexed
+                file_id = await self.vector_store.ingest_file(folder_id, str(file_path), file_info, [])
+                logger.debug(f"📄 Added file to database with ID: {file_id}")
                 return
 
             logger.debug(f"📝 Extracted content length: {len(content)} characters")
@@ -271,19 +277,23 @@ class FileIndexer:
             chunks = self._split_text(content)
             logger.debug(f"📝 Split content into {len(chunks)} chunks")
 
-            # Generate embeddings and store chunks
+            # Generate embeddings for every chunk before touching the database
+            embedded_chunks = []
             for i, chunk in enumerate(chunks):
                 if chunk.strip():  # Only process non-empty chunks
                     try:
                         logger.debug(f"🧮 Generating embedding for chunk {i+1}/{len(chunks)}")
                         embedding = await self.embedding_service.generate_embedding(chunk)
-                        await self.vector_store.add_document_chunk(file_id, i, chunk, embedding)
-                        logger.debug(f"✅ Stored chunk {i+1} with embedding")
+                        embedded_chunks.append((i, chunk, embedding))
                     except Exception as e:
                         logger.error(f"❌ Error processing chunk {i} of {file_path}: {str(e)}")
                         continue
 
-            logger.info(f"✅ Successfully indexed {file_path} with {len(chunks)} chunks")
+            # Store the file and its chunks in a single transaction
+            file_id = await self.vector_store.ingest_file(folder_id, str(file_path), file_info, embedded_chunks)
+            logger.debug(f"📄 Added file to database with ID: {file_id}")
+
+            logger.info(f"✅ Successfully indexed {file_path} with {len(embedded_chunks)} chunks")
 
         except Exception as e:
             logger.error(f"❌ Error indexing file {file_path}: {str(e)}")
@@ -1,8 +1,13 @@
 import os
 import sqlite3
 import json
+import hashlib
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import logging
 from pathlib import Path
@@ -10,22 +15,308 @@ import traceback
 
 logger = logging.getLogger(__name__)
 
+# Hot-path statements are kept as constants so every call hands sqlite3 the identical
+# SQL text and hits the connection's prepared statement cache instead of re-parsing.
+
+# Upserts update an existing row in place. INSERT OR REPLACE deleted it instead, which
+# cascaded to every file and chunk below it and handed out a new id. RETURNING (SQLite 3.35+)
+# gives back the id of either the new or the updated row
+SQL_UPSERT_FOLDER = """
+    INSERT INTO folders (path, last_indexed) VALUES (?, ?)
+    ON CONFLICT(path) DO UPDATE SET last_indexed = excluded.last_indexed
+    RETURNING id
+"""
+
+SQL_UPSERT_FILE = """
+    INSERT INTO files
+    (folder_id, file_path, file_name, file_type, file_size, last_modified, content_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(file_path) DO UPDATE SET
+        folder_id = excluded.folder_id,
+        file_name = excluded.file_name,
+        file_type = excluded.file_type,
+        file_size = excluded.file_size,
+        last_modified = excluded.last_modified,
+        content_hash = excluded.content_hash
+    RETURNING id
+"""
+
+SQL_DELETE_FILE_CHUNKS = "DELETE FROM document_chunks WHERE file_id = ?"
+
+SQL_INSERT_CHUNK = """
+    INSERT INTO document_chunks (file_id, chunk_index, content, embedding)
+    VALUES (?, ?, ?, ?)
+"""
+
+SQL_SELECT_EMBEDDINGS = "SELECT id, embedding FROM document_chunks"
+
+SQL_SELECT_CHUNK_DETAILS = """
+    SELECT 
+        dc.id,
+        dc.content,
+        f.file_path,
+        f.file_name,
+        f.file_type,
+        f.last_modified
+    FROM document_chunks dc
+    JOIN files f ON dc.file_id = f.id
+    WHERE dc.id IN ({placeholders})
+"""
+
+# sqlite-vec shadow table holding a float32 copy of every chunk embedding, keyed by document_chunks.id
+SQL_CREATE_VEC_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS vec_chunks
+    USING vec0(embedding float[{dimension}] distance_metric=cosine)
+"""
+
+# TEMP so databases opened without the extension never see a trigger they cannot run;
+# it also fires for rows removed by the ON DELETE CASCADE from files and folders
+SQL_CREATE_VEC_CLEANUP_TRIGGER = """
+    CREATE TEMP TRIGGER IF NOT EXISTS vec_chunks_cleanup
+    AFTER DELETE ON main.document_chunks
+    BEGIN
+        DELETE FROM vec_chunks WHERE rowid = old.id;
+    END
+"""
+
+SQL_INSERT_VEC = "INSERT INTO vec_chunks (rowid, embedding) VALUES (?, ?)"
+
+# Bring vec_chunks back in line with document_chunks, e.g. for databases indexed before
+# sqlite-vec was installed or while the extension could not be loaded
+SQL_DELETE_ORPHAN_VECS = "DELETE FROM vec_chunks WHERE rowid NOT IN (SELECT id FROM document_chunks)"
+
+# Chunks without a vector and vectors without a chunk. Row counts alone can match while
+# both are non-zero, e.g. after a file was re-indexed in a run without the extension.
+# Chunks without an embedding have nothing to index and are left out throughout
+SQL_CHECK_VEC_DRIFT = """
+    SELECT
+        EXISTS(
+            SELECT 1 FROM document_chunks
+            WHERE embedding IS NOT NULL AND id NOT IN (SELECT rowid FROM vec_chunks)
+        ) AS missing,
+        EXISTS(SELECT 1 FROM vec_chunks WHERE rowid NOT IN (SELECT id FROM document_chunks)) AS orphaned
+"""
+
+SQL_SELECT_MISSING_VECS = """
+    SELECT id, embedding AS "embedding [embedding]" FROM document_chunks
+    WHERE embedding IS NOT NULL AND id NOT IN (SELECT rowid FROM vec_chunks)
+"""
+
+SQL_SEARCH_VEC = "SELECT rowid AS id, distance FROM vec_chunks WHERE embedding MATCH ? AND k = ?"
+
+# Chunks of files in one indexed folder; used to scope search to that folder
+SQL_SELECT_FOLDER_CHUNK_IDS = """
+    SELECT dc.id FROM files f
+    JOIN document_chunks dc ON dc.file_id = f.id
+    WHERE f.folder_id = ?
+"""
+
+SQL_SEARCH_VEC_IN_FOLDER = SQL_SEARCH_VEC + f" AND rowid IN ({SQL_SELECT_FOLDER_CHUNK_IDS})"
+
+SQL_SELECT_INDEXED_FILES = """
+    SELECT 
+        f.id,
+        f.file_path,
+        f.file_name,
+        f.file_type,
+        f.file_size,
+        f.last_modified,
+        fo.path as folder_path,
+        (SELECT COUNT(1) FROM document_chunks dc WHERE dc.file_id = f.id) as chunk_count
+    FROM files f
+    JOIN folders fo ON f.folder_id = fo.id
+    ORDER BY f.file_name
+"""
+
+SQL_SELECT_INDEXED_FOLDERS = """
+    SELECT 
+        f.id,
+        f.path,
+        f.last_indexed,
+        (SELECT COUNT(1) FROM files WHERE files.folder_id = f.id) as file_count
+    FROM folders f
+    ORDER BY f.last_indexed DESC
+"""
+
+SQL_COUNT_ALL = """
+    SELECT
+        (SELECT COUNT(*) FROM folders) as folders,
+        (SELECT COUNT(*) FROM files) as files,
+        (SELECT COUNT(*) FROM document_chunks) as chunks
+"""
+
+SQL_INSERT_QUERY_EMBEDDING = "INSERT OR REPLACE INTO query_embedding_cache (hash, embedding) VALUES (?, ?)"
+
+SQL_SELECT_QUERY_EMBEDDINGS = """
+    SELECT hash, embedding AS "embedding [vector_f32]" FROM query_embedding_cache WHERE hash IN ({placeholders})
+"""
+
+SQL_SELECT_RECENT_QUERY_EMBEDDINGS = """
+    SELECT hash, embedding AS "embedding [vector_f32]" FROM (
+        SELECT rowid, hash, embedding FROM query_embedding_cache ORDER BY rowid DESC LIMIT ?
+    ) ORDER BY rowid
+"""
+
+SQL_TRIM_QUERY_EMBEDDINGS = """
+    DELETE FROM query_embedding_cache WHERE rowid NOT IN (
+        SELECT rowid FROM query_embedding_cache ORDER BY rowid DESC LIMIT ?
+    )
+"""
+
+# Bumped whenever _migrate_schema learns a new step; stored in PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# On-disk dtype of document_chunks.embedding. float16 halves the bytes read per search
+# with negligible recall loss for MiniLM embeddings; vectors are float32 once in memory.
+# Stored vectors are L2-normalized, so similarity is a plain dot product
+EMBEDDING_DTYPE = np.float16
+
+# Statement cache size for the connection (sqlite3 defaults to 128)
+CACHED_STATEMENTS = 1024
+
+# Connection tuning: WAL lets readers run alongside the writer and, with synchronous=NORMAL,
+# only fsyncs at checkpoints; a 64 MB page cache and 256 MB of mmap cut read syscalls
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -64000",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA wal_autocheckpoint = 1000",
+)
+
+# Read-only connections, one per reader thread. With WAL they run alongside the writer
+# instead of queueing behind it on the single write connection
+READ_POOL_SIZE = min(4, os.cpu_count() or 1)
+
+# Write-behind queue for document chunks: flush once this many rows are pending,
+# or after this many seconds, whichever comes first
+CHUNK_FLUSH_ROWS = 1000
+CHUNK_FLUSH_INTERVAL = 0.25
+
+# Rows per tile of the in-memory embedding matrix; each tile keeps a centroid and radius
+# so whole tiles that cannot reach the similarity threshold are skipped
+EMBEDDING_TILE_ROWS = 256
+
+# Rows fetched per batch when streaming embeddings into the in-memory matrix
+EMBEDDING_FETCH_ROWS = 1024
+
+# Number of distinct query embeddings kept in memory by search, and in the
+# query_embedding_cache table that warms the in-memory cache after a restart
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_PERSIST_ROWS = 10000
+
+def _adapt_array(array: np.ndarray) -> memoryview:
+    # Bind numpy vectors as BLOBs straight from their buffer, without a tobytes() copy
+    return memoryview(np.ascontiguousarray(array)).cast("B")
+
+
+# Columns aliased as "name [embedding]" or "name [vector_f32]" come back as float32 arrays
+# (the connections are opened with PARSE_COLNAMES)
+sqlite3.register_adapter(np.ndarray, _adapt_array)
+sqlite3.register_converter("embedding", lambda blob: np.frombuffer(blob, dtype=EMBEDDING_DTYPE).astype(np.float32))
+sqlite3.register_converter("vector_f32", lambda blob: np.frombuffer(blob, dtype=np.float32))
+
 class VectorStore:
     def __init__(self, db_path: str = "smartfile_ai.db"):
         self.db_path = db_path
         self.connection = None
+        # sqlite3 calls block, so every query runs on this worker thread instead of the event loop.
+        # A single worker keeps access to the shared connection serialized.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-store")
+        # Pure reads run on this pool instead, each thread on its own read-only connection
+        self._read_executor = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="vector-store-read")
+        self._read_local = threading.local()
+        self._read_connections: List[sqlite3.Connection] = []
+        self._read_connections_lock = threading.Lock()
+        # sqlite-vec state: extension loaded, vec_chunks created, and vec_chunks mirrors document_chunks
+        self._vec_available = False
+        self._vec_table_exists = False
+        self._vec_ready = False
+        # Chunks accepted by add_document_chunk but not yet written to the database
+        self._pending: List[tuple] = []
+        self._pending_lock = threading.Lock()
+        # Batches taken off _pending whose INSERT has not committed yet
+        self._flushes_in_flight = 0
+        self._flush_task = None
+        # Created on first use and shared with FileIndexer; recent query embeddings are cached (LRU)
+        self._embedding_service = None
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Newly generated query embeddings waiting to be written to query_embedding_cache
+        self._unsaved_queries: Dict[str, np.ndarray] = {}
+        # In-memory copy of all embeddings for brute-force search, rebuilt after writes
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._chunk_ids: Optional[np.ndarray] = None
+        self._tile_starts: Optional[np.ndarray] = None
+        self._tile_centroids: Optional[np.ndarray] = None
+        self._tile_radii: Optional[np.ndarray] = None
+        # GPU copy of _emb_matrix for search_batch; _gpu_device is resolved on first use
+        self._emb_matrix_gpu = None
+        self._gpu_device: Optional[str] = None
+        self._gpu_checked = False
+
+    async def _run(self, func, *args):
+        """Run a blocking database function on the store's worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._flush_then_call, func, *args)
+
+    def _flush_then_call(self, func, *args):
+        # Write queued chunks first so every read sees them and deletes cannot orphan them
+        self._flush_pending_sync()
+        return func(*args)
+
+    async def _run_read(self, func, *args):
+        """Run a read-only database function on the reader pool"""
+        if self._pending or self._flushes_in_flight:
+            # Reads must still see chunks queued by add_document_chunk, including a batch the
+            # writer has already taken but not committed; flush() queues behind that write
+            await self.flush()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, func, *args)
+
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a connection with the store's row factory and PRAGMAs"""
+        connection = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+            detect_types=sqlite3.PARSE_COLNAMES
+        )
+        connection.row_factory = sqlite3.Row
+        # Ensure foreign keys are enabled immediately after connection
+        connection.execute("PRAGMA foreign_keys = ON")
+        for pragma in SQLITE_PRAGMAS:
+            connection.execute(pragma)
+        return connection
+
+    def _read_connection(self) -> sqlite3.Connection:
+        """Return the calling reader thread's connection, opening it on first use"""
+        connection = getattr(self._read_local, "connection", None)
+        if connection is None:
+            connection = self._open_connection()
+            connection.execute("PRAGMA query_only = 1")
+            if self._vec_available:
+                self._load_vector_extension(connection)
+            self._read_local.connection = connection
+            with self._read_connections_lock:
+                self._read_connections.append(connection)
+        return connection
 
     async def initialize(self):
         """Initialize the SQLite database with vector support"""
         try:
             logger.info(f"Initializing database at: {os.path.abspath(self.db_path)}")
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.connection.row_factory = sqlite3.Row
-            # Ensure foreign keys are enabled immediately after connection
-            self.connection.execute("PRAGMA foreign_keys = ON")
+            self.connection = self._open_connection()
 
             # Create tables
-            await self._create_tables()
+            await self._run(self._create_tables)
+            await self._run(self._setup_vector_index)
+
+            for key, embedding in (await self._run_read(self._load_recent_query_embeddings)).items():
+                self._cache_query_embedding(key, embedding, persist=False)
+
+            self._flush_task = asyncio.create_task(self._flush_loop())
 
             # Log initial stats
             stats = await self.get_debug_stats()
@@ -36,7 +327,7 @@ class VectorStore:
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
-    async def _create_tables(self):
+    def _create_tables(self):
         """Create necessary database tables"""
         cursor = self.connection.cursor()
 
@@ -81,10 +372,26 @@ class VectorStore:
                 )
             """)
 
+            # Query embeddings keyed by the sha256 of the normalized query text
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS query_embedding_cache (
+                    hash TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL
+                )
+            """)
+
             # Create indexes for better performance
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_path ON files(file_path)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_file ON document_chunks(file_id)")
+            # (file_id, chunk_index) returns a file's chunks in order and also serves every
+            # file_id lookup, so it replaces the older single-column idx_chunks_file
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_file_order ON document_chunks(file_id, chunk_index)")
+            cursor.execute("DROP INDEX IF EXISTS idx_chunks_file")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_folders_path ON folders(path)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_folder ON files(folder_id, id, file_name)")
+            # Lets get_indexed_files walk files in name order instead of sorting
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_name ON files(file_name)")
+
+            self._migrate_schema()
 
             self.connection.commit()
             logger.info("Database tables created successfully")
@@ -94,35 +401,150 @@ class VectorStore:
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
-    async def get_debug_stats(self) -> Dict[str, Any]:
-        """Get detailed debug statistics"""
-        cursor = self.connection.cursor()
+    def _migrate_schema(self):
+        """Upgrade databases created by older versions to SCHEMA_VERSION"""
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
+        logger.info(f"Migrating database schema from version {version} to {SCHEMA_VERSION}")
+
+        if version < 2:
+            # Re-encode float32 embeddings in the storage dtype
+            rows = self.connection.execute(
+                "SELECT id, embedding FROM document_chunks WHERE embedding IS NOT NULL"
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE document_chunks SET embedding = ? WHERE id = ?",
+                [(np.frombuffer(row['embedding'], dtype=np.float32).astype(EMBEDDING_DTYPE).tobytes(), row['id'])
+                 for row in rows]
+            )
+            logger.info(f"Converted {len(rows)} embeddings to {np.dtype(EMBEDDING_DTYPE).name}")
+
+        if version < 3:
+            # Scale stored embeddings to unit length
+            rows = self.connection.execute(
+                'SELECT id, embedding AS "embedding [embedding]" FROM document_chunks WHERE embedding IS NOT NULL'
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE document_chunks SET embedding = ? WHERE id = ?",
+                [(self._encode_embedding(row['embedding']), row['id']) for row in rows]
+            )
+            logger.info(f"Normalized {len(rows)} stored embeddings")
+
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _load_vector_extension(self, connection: sqlite3.Connection) -> bool:
+        """Load the sqlite-vec extension into a connection if it is installed"""
+        try:
+            import sqlite_vec
+        except ImportError:
+            logger.warning("sqlite-vec not installed, falling back to brute-force search. Install it with: pip install sqlite-vec")
+            return False
+
+        try:
+            connection.enable_load_extension(True)
+            sqlite_vec.load(connection)
+            connection.enable_load_extension(False)
+        except (AttributeError, sqlite3.Error) as e:
+            # AttributeError: this Python's sqlite3 was built without extension loading
+            logger.warning(f"Could not load sqlite-vec extension, falling back to brute-force search: {str(e)}")
+            return False
+
+        logger.info("Loaded sqlite-vec extension")
+        return True
+
+    def _setup_vector_index(self):
+        """Prepare the vec_chunks shadow table used for native KNN search"""
+        self._vec_available = self._load_vector_extension(self.connection)
+        if not self._vec_available:
+            return
 
         try:
-            # Count folders
-            cursor.execute("SELECT COUNT(*) as count FROM folders")
-            folder_count = cursor.fetchone()['count']
+            cursor = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'vec_chunks'"
+            )
+            self._vec_table_exists = cursor.fetchone() is not None
+
+            if self._vec_table_exists:
+                self.connection.execute(SQL_CREATE_VEC_CLEANUP_TRIGGER)
+                drift = self.connection.execute(SQL_CHECK_VEC_DRIFT).fetchone()
+                out_of_sync = bool(drift['missing'] or drift['orphaned'])
+            else:
+                out_of_sync = self.connection.execute(
+                    "SELECT EXISTS(SELECT 1 FROM document_chunks WHERE embedding IS NOT NULL)"
+                ).fetchone()[0] == 1
+
+            if out_of_sync:
+                logger.info("sqlite-vec index out of sync with document_chunks, rebuilding...")
+                self._sync_vector_index()
+
+            vec_count = 0
+            if self._vec_table_exists:
+                vec_count = self._count_rows("SELECT COUNT(*) as count FROM vec_chunks", self.connection)
+
+            self._vec_ready = True
+            logger.info(f"sqlite-vec index ready ({vec_count} vectors)")
+
+        except sqlite3.Error as e:
+            # Only trust the index when it covers every chunk; otherwise keep brute-force search
+            self.connection.rollback()
+            logger.error(f"Error preparing sqlite-vec index, using brute-force search: {str(e)}")
+            self._vec_ready = False
 
-            # Count files
-            cursor.execute("SELECT COUNT(*) as count FROM files")
-            file_count = cursor.fetchone()['count']
+    def _sync_vector_index(self):
+        """Drop vectors of deleted chunks and add vectors for chunks missing from vec_chunks"""
+        if not self._vec_table_exists:
+            row = self.connection.execute(
+                "SELECT embedding FROM document_chunks WHERE embedding IS NOT NULL LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            dimension = len(row['embedding']) // np.dtype(EMBEDDING_DTYPE).itemsize
+            self.connection.execute(SQL_CREATE_VEC_TABLE.format(dimension=dimension))
+            self.connection.execute(SQL_CREATE_VEC_CLEANUP_TRIGGER)
+            self._vec_table_exists = True
 
-            # Count chunks
-            cursor.execute("SELECT COUNT(*) as count FROM document_chunks")
-            chunk_count = cursor.fetchone()['count']
+        self.connection.execute(SQL_DELETE_ORPHAN_VECS)
+        # vec0 only takes float32 vectors, so stored embeddings are converted here rather than in SQL
+        rows = self.connection.execute(SQL_SELECT_MISSING_VECS).fetchall()
+        self.connection.executemany(SQL_INSERT_VEC, [(row['id'], row['embedding']) for row in rows])
+        self.connection.commit()
+        logger.info(f"Backfilled {len(rows)} vectors into sqlite-vec index")
+
+    def _index_vector(self, chunk_id: int, embedding: np.ndarray):
+        """Mirror a chunk embedding into vec_chunks, creating the table on first use"""
+        if not self._vec_table_exists:
+            self.connection.execute(SQL_CREATE_VEC_TABLE.format(dimension=embedding.shape[0]))
+            self.connection.execute(SQL_CREATE_VEC_CLEANUP_TRIGGER)
+            self._vec_table_exists = True
+            logger.info(f"Created sqlite-vec table for {embedding.shape[0]}-dimensional embeddings")
+
+        self.connection.execute(SQL_INSERT_VEC, (chunk_id, embedding))
+
+    async def get_debug_stats(self) -> Dict[str, Any]:
+        """Get detailed debug statistics"""
+        return await self._run_read(self._get_debug_stats_sync)
+
+    def _get_debug_stats_sync(self) -> Dict[str, Any]:
+        connection = self._read_connection()
+
+        try:
+            # Count folders, files and chunks in one statement
+            counts = connection.execute(SQL_COUNT_ALL).fetchone()
 
             # Get file types
-            cursor.execute("SELECT file_type, COUNT(*) as count FROM files GROUP BY file_type")
-            file_types = {row['file_type']: row['count'] for row in cursor.fetchall()}
+            rows = connection.execute("SELECT file_type, COUNT(*) as count FROM files GROUP BY file_type").fetchall()
+            file_types = {row['file_type']: row['count'] for row in rows}
 
             # Get recent files
-            cursor.execute("SELECT file_name, file_path FROM files ORDER BY id DESC LIMIT 5")
-            recent_files = [{'name': row['file_name'], 'path': row['file_path']} for row in cursor.fetchall()]
+            rows = connection.execute("SELECT file_name, file_path FROM files ORDER BY id DESC LIMIT 5").fetchall()
+            recent_files = [{'name': row['file_name'], 'path': row['file_path']} for row in rows]
 
             return {
-                'folders': folder_count,
-                'files': file_count,
-                'chunks': chunk_count,
+                'folders': counts['folders'],
+                'files': counts['files'],
+                'chunks': counts['chunks'],
                 'file_types': file_types,
                 'recent_files': recent_files,
                 'database_path': os.path.abspath(self.db_path)
@@ -134,26 +556,24 @@ class VectorStore:
 
     async def get_total_indexed_files(self) -> int:
         """Get total number of indexed files"""
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM files")
-        return cursor.fetchone()['count']
+        return await self._run_read(self._count_rows, "SELECT COUNT(*) as count FROM files")
 
     async def get_total_chunks(self) -> int:
         """Get total number of document chunks"""
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT COUNT(*) as count FROM document_chunks")
-        return cursor.fetchone()['count']
+        return await self._run_read(self._count_rows, "SELECT COUNT(*) as count FROM document_chunks")
+
+    def _count_rows(self, sql: str, connection: Optional[sqlite3.Connection] = None) -> int:
+        # Defaults to the reader pool; the writer passes its own connection
+        return (connection or self._read_connection()).execute(sql).fetchone()['count']
 
     async def add_folder(self, folder_path: str) -> int:
         """Add a folder to the database"""
-        cursor = self.connection.cursor()
+        return await self._run(self._add_folder_sync, folder_path)
+
+    def _add_folder_sync(self, folder_path: str) -> int:
         try:
-            cursor.execute(
-                "INSERT OR REPLACE INTO folders (path, last_indexed) VALUES (?, ?)",
-                (folder_path, datetime.now())
-            )
+            folder_id = self.connection.execute(SQL_UPSERT_FOLDER, (folder_path, datetime.now())).fetchone()['id']
             self.connection.commit()
-            folder_id = cursor.lastrowid
             logger.info(f"Added folder to database: {folder_path} (ID: {folder_id})")
             return folder_id
         except Exception as e:
@@ -162,163 +582,679 @@ class VectorStore:
 
     async def add_file(self, folder_id: int, file_path: str, file_info: Dict[str, Any]) -> int:
         """Add a file to the database"""
-        cursor = self.connection.cursor()
+        return await self._run(self._add_file_sync, folder_id, file_path, file_info)
+
+    def _add_file_sync(self, folder_id: int, file_path: str, file_info: Dict[str, Any]) -> int:
         try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO files 
-                (folder_id, file_path, file_name, file_type, file_size, last_modified, content_hash)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                folder_id,
-                file_path,
-                file_info.get('name', Path(file_path).name),
-                file_info.get('type', Path(file_path).suffix),
-                file_info.get('size', 0),
-                file_info.get('modified', datetime.now()),
-                file_info.get('hash', '')
-            ))
+            file_id = self._upsert_file(folder_id, file_path, file_info)
             self.connection.commit()
-            file_id = cursor.lastrowid
             logger.debug(f"Added file to database: {file_info.get('name')} (ID: {file_id})")
             return file_id
         except Exception as e:
             logger.error(f"Error adding file {file_path}: {str(e)}")
             raise
 
-    async def add_document_chunk(self, file_id: int, chunk_index: int, content: str, embedding: np.ndarray):
-        """Add a document chunk with its embedding"""
-        cursor = self.connection.cursor()
+    async def add_files_bulk(self, folder_id: int, files: List[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """Add many (file_path, file_info) files in one transaction; returns their ids in order"""
+        return await self._run(self._add_files_bulk_sync, folder_id, files)
 
+    def _add_files_bulk_sync(self, folder_id: int, files: List[Tuple[str, Dict[str, Any]]]) -> List[int]:
         try:
-            # Convert numpy array to bytes for storage
-            embedding_bytes = embedding.astype(np.float32).tobytes()
+            # One commit for the whole batch; the connection context manager rolls back on error
+            with self.connection:
+                file_ids = [self._upsert_file(folder_id, file_path, file_info) for file_path, file_info in files]
+            logger.debug(f"Added {len(file_ids)} files to database")
+            return file_ids
+        except Exception as e:
+            self._invalidate_embedding_matrix()
+            logger.error(f"Error adding {len(files)} files: {str(e)}")
+            raise
 
-            cursor.execute("""
-                INSERT INTO document_chunks (file_id, chunk_index, content, embedding)
-                VALUES (?, ?, ?, ?)
-            """, (file_id, chunk_index, content, embedding_bytes))
+    async def ingest_file(self, folder_id: int, file_path: str, file_info: Dict[str, Any],
+                          chunks: List[Tuple[int, str, np.ndarray]]) -> int:
+        """Add a file and all of its (chunk_index, content, embedding) chunks in one transaction"""
+        chunks = [(chunk_index, content, embedding.astype(np.float32)) for chunk_index, content, embedding in chunks]
+        return await self._run(self._ingest_file_sync, folder_id, file_path, file_info, chunks)
+
+    def _ingest_file_sync(self, folder_id: int, file_path: str, file_info: Dict[str, Any],
+                          chunks: List[Tuple[int, str, np.ndarray]]) -> int:
+        try:
+            file_id = self._upsert_file(folder_id, file_path, file_info)
+
+            self._insert_chunks([
+                (file_id, chunk_index, content, embedding)
+                for chunk_index, content, embedding in chunks
+            ])
 
             self.connection.commit()
-            logger.debug(f"Added chunk {chunk_index} for file {file_id} (content length: {len(content)})")
+            logger.debug(f"Ingested file {file_info.get('name')} (ID: {file_id}) with {len(chunks)} chunks")
+            return file_id
+
+        except Exception as e:
+            self.connection.rollback()
+            self._invalidate_embedding_matrix()
+            logger.error(f"Error ingesting file {file_path}: {str(e)}")
+            raise
+
+    def _upsert_file(self, folder_id: int, file_path: str, file_info: Dict[str, Any]) -> int:
+        """Insert or update a file row and drop any chunks of its previous version"""
+        file_id = self.connection.execute(
+            SQL_UPSERT_FILE,
+            self._file_params(folder_id, file_path, file_info)
+        ).fetchone()['id']
+
+        # The in-memory matrix still holds the old chunks
+        if self.connection.execute(SQL_DELETE_FILE_CHUNKS, (file_id,)).rowcount > 0:
+            self._invalidate_embedding_matrix()
+        return file_id
+
+    async def prune_folder_files(self, folder_id: int, keep_paths: List[str]) -> int:
+        """Remove files of a folder that are not in keep_paths; returns how many were removed"""
+        return await self._run(self._prune_folder_files_sync, folder_id, keep_paths)
+
+    def _prune_folder_files_sync(self, folder_id: int, keep_paths: List[str]) -> int:
+        try:
+            keep = set(keep_paths)
+            rows = self.connection.execute("SELECT id, file_path FROM files WHERE folder_id = ?", (folder_id,)).fetchall()
+            stale = [(row['id'],) for row in rows if row['file_path'] not in keep]
+            if stale:
+                with self.connection:
+                    self.connection.executemany("DELETE FROM files WHERE id = ?", stale)
+                self._invalidate_embedding_matrix()
+                logger.info(f"Removed {len(stale)} files no longer present in folder {folder_id}")
+            return len(stale)
+        except Exception as e:
+            logger.error(f"Error pruning files of folder {folder_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def _file_params(folder_id: int, file_path: str, file_info: Dict[str, Any]) -> tuple:
+        """Build the SQL_UPSERT_FILE parameters for a file"""
+        return (
+            folder_id,
+            file_path,
+            file_info.get('name', Path(file_path).name),
+            file_info.get('type', Path(file_path).suffix),
+            file_info.get('size', 0),
+            file_info.get('modified', datetime.now()),
+            file_info.get('hash', '')
+        )
+
+    async def add_document_chunk(self, file_id: int, chunk_index: int, content: str, embedding: np.ndarray):
+        """Queue a document chunk with its embedding; it is written in the next batch"""
+        with self._pending_lock:
+            self._pending.append((file_id, chunk_index, content, embedding.astype(np.float32)))
+            pending_count = len(self._pending)
+
+        logger.debug(f"Queued chunk {chunk_index} for file {file_id} (content length: {len(content)})")
+
+        if pending_count >= CHUNK_FLUSH_ROWS:
+            await self.flush()
+
+    async def add_document_chunks(self, file_id: int, chunks: List[Tuple[int, str, np.ndarray]]):
+        """Write many (chunk_index, content, embedding) chunks of a file in one transaction"""
+        batch = [(file_id, chunk_index, content, embedding.astype(np.float32))
+                 for chunk_index, content, embedding in chunks]
+        await self._run(self._add_document_chunks_sync, batch)
 
+    def _add_document_chunks_sync(self, batch: List[tuple]):
+        try:
+            with self.connection:
+                self._insert_chunks(batch)
+            logger.debug(f"Added {len(batch)} document chunks")
         except Exception as e:
-            logger.error(f"Error adding document chunk: {str(e)}")
+            self._invalidate_embedding_matrix()
+            logger.error(f"Error adding {len(batch)} document chunks: {str(e)}")
             raise
 
-    async def search(self, query: str, limit: int = 10, threshold: float = 0.3) -> List[Dict[str, Any]]:
-        """Search for similar document chunks using cosine similarity"""
+    async def flush(self):
+        """Write all queued document chunks to the database"""
+        await self._run(self._flush_pending_sync)
+
+    async def _flush_loop(self):
+        """Periodically write queued chunks so they never wait long for a batch to fill"""
+        while True:
+            await asyncio.sleep(CHUNK_FLUSH_INTERVAL)
+            if self._pending:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.error(f"Error in background chunk flush: {str(e)}")
+            if self._unsaved_queries:
+                entries, self._unsaved_queries = self._unsaved_queries, {}
+                await self._run(self._save_query_embeddings_sync, entries)
+
+    def _flush_pending_sync(self):
+        with self._pending_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            self._flushes_in_flight += 1
+
+        try:
+            self._write_pending_batch(batch)
+        finally:
+            with self._pending_lock:
+                self._flushes_in_flight -= 1
+
+    def _write_pending_batch(self, batch: List[tuple]):
+        """Commit a batch of queued chunks, falling back to one row at a time on error"""
+        try:
+            self._insert_chunks(batch)
+            self.connection.commit()
+            logger.debug(f"Flushed {len(batch)} document chunks")
+        except sqlite3.Error as e:
+            self.connection.rollback()
+            self._invalidate_embedding_matrix()
+            logger.error(f"Error flushing {len(batch)} document chunks, retrying one at a time: {str(e)}")
+            # Isolate the failing rows instead of losing the whole batch
+            for chunk in batch:
+                try:
+                    self._insert_chunks([chunk])
+                    self.connection.commit()
+                except sqlite3.Error as e:
+                    self.connection.rollback()
+                    self._invalidate_embedding_matrix()
+                    logger.error(f"Error adding document chunk {chunk[1]} for file {chunk[0]}: {str(e)}")
+
+    def _insert_chunks(self, batch: List[tuple]):
+        """Insert (file_id, chunk_index, content, embedding) rows in the current transaction"""
+        if not batch:
+            return
+
+        last_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM document_chunks").fetchone()[0]
+
+        stored = [self._encode_embedding(chunk[3]) for chunk in batch]
+        # Work with the stored precision from here on, so memory and disk agree
+        embeddings = [vector.astype(np.float32) for vector in stored]
+
+        self.connection.executemany(SQL_INSERT_CHUNK, [
+            (file_id, chunk_index, content, vector)
+            for (file_id, chunk_index, content, _), vector in zip(batch, stored)
+        ])
+
+        if not self._vec_ready and self._emb_matrix is None:
+            return
+
+        # AUTOINCREMENT ids are always above the previous maximum, in insertion order
+        cursor = self.connection.execute(
+            "SELECT id FROM document_chunks WHERE id > ? ORDER BY id", (last_id,)
+        )
+        chunk_ids = [row['id'] for row in cursor.fetchall()]
+
+        # Extend the in-memory matrix rather than reloading every embedding on the next search
+        self._append_to_embedding_matrix(chunk_ids, embeddings)
+
+        if self._vec_ready:
+            try:
+                for chunk_id, embedding in zip(chunk_ids, embeddings):
+                    self._index_vector(chunk_id, embedding)
+            except sqlite3.Error as e:
+                # e.g. an embedding dimension that differs from the existing index
+                logger.error(f"Error indexing chunks in sqlite-vec, falling back to brute-force search: {str(e)}")
+                self._vec_ready = False
+
+    async def search(self, query: str, limit: int = 10, threshold: float = 0.3,
+                     folder_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search for similar document chunks using cosine similarity, optionally within one folder"""
         try:
-            logger.info(f"Starting search for: '{query}' (threshold: {threshold}, limit: {limit})")
+            logger.info(f"Starting search for: '{query}' (threshold: {threshold}, limit: {limit}, folder: {folder_id})")
+
+            if self._vec_ready and self._vec_table_exists:
+                query_embedding = await self._embed_query(query)
+                return await self._run_read(self._search_vector_index, query_embedding, limit, threshold, folder_id)
+
+            # Load the stored embeddings on the worker thread while the query is being embedded
+            query_embedding, _, chunk_scope = await asyncio.gather(
+                self._embed_query(query),
+                self._run(self._load_embedding_matrix_sync),
+                self._run_read(self._get_folder_chunk_ids, folder_id) if folder_id is not None else asyncio.sleep(0)
+            )
 
+        except Exception as e:
+            logger.error(f"Search error: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            raise
+
+        # The matrix lives with the writer; chunk details are read from the reader pool
+        ranked = await self._run(self._rank_embeddings_sync, query_embedding, limit, threshold, chunk_scope)
+        return await self._run_read(self._build_results, ranked)
+
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing the embedding of an identical earlier query"""
+        text = self._normalize_query(query)
+        key = self._query_cache_key(text)
+
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            self._query_cache.move_to_end(key)
+            logger.debug("Using cached query embedding")
+            return cached
+
+        persisted = await self._run_read(self._load_query_embeddings, [key])
+        if key in persisted:
+            logger.debug("Using persisted query embedding")
+            self._cache_query_embedding(key, persisted[key], persist=False)
+            return persisted[key]
+
+        query_embedding = await self.embedding_service.generate_embedding(text)
+        logger.debug(f"Generated query embedding with shape: {query_embedding.shape}")
+
+        self._cache_query_embedding(key, query_embedding)
+        return query_embedding
+
+    async def _embed_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Embed several queries, encoding all cache misses in one model call"""
+        texts = [self._normalize_query(query) for query in queries]
+        keys = [self._query_cache_key(text) for text in texts]
+        missing = {key: text for key, text in zip(keys, texts) if key not in self._query_cache}
+
+        if missing:
+            persisted = await self._run_read(self._load_query_embeddings, list(missing))
+            for key, embedding in persisted.items():
+                self._cache_query_embedding(key, embedding, persist=False)
+                del missing[key]
+
+        if missing:
+            embeddings = await self.embedding_service.generate_embeddings(list(missing.values()))
+            for key, embedding in zip(missing, embeddings):
+                self._cache_query_embedding(key, embedding)
+
+        return [self._query_cache[key] for key in keys]
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        # MiniLM is uncased, so case and whitespace differences map to the same embedding
+        return " ".join(query.lower().split())
+
+    def _query_cache_key(self, text: str) -> str:
+        # Keyed by model as well, so a persisted embedding from another model (or of
+        # another width) is never served after the model changes
+        service = self.embedding_service
+        identity = f"{service.model_name}\0{service.get_embedding_dimension()}\0{text}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    @property
+    def embedding_service(self):
+        """The EmbeddingService for queries, created on first use; FileIndexer shares it"""
+        if self._embedding_service is None:
             from .embedding_service import EmbeddingService
+            self._embedding_service = EmbeddingService()
+        return self._embedding_service
 
-            # Generate embedding for the query
-            embedding_service = EmbeddingService()
-            query_embedding = await embedding_service.generate_embedding(query)
-            logger.debug(f"Generated query embedding with shape: {query_embedding.shape}")
+    def _cache_query_embedding(self, key: str, embedding: np.ndarray, persist: bool = True):
+        self._query_cache[key] = embedding
+        if len(self._query_cache) > QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        if persist:
+            self._unsaved_queries[key] = embedding
 
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                SELECT 
-                    dc.content,
-                    dc.embedding,
-                    f.file_path,
-                    f.file_name,
-                    f.file_type,
-                    f.last_modified
-                FROM document_chunks dc
-                JOIN files f ON dc.file_id = f.id
-            """)
+    def _load_query_embeddings(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Look up persisted query embeddings by cache key"""
+        placeholders = ",".join("?" * len(keys))
+        cursor = self._read_connection().execute(SQL_SELECT_QUERY_EMBEDDINGS.format(placeholders=placeholders), keys)
+        return {row['hash']: row['embedding'] for row in cursor.fetchall()}
 
-            results = []
-            query_embedding_norm = np.linalg.norm(query_embedding)
+    def _load_recent_query_embeddings(self) -> Dict[str, np.ndarray]:
+        """Return the most recently saved query embeddings, oldest first"""
+        cursor = self._read_connection().execute(SQL_SELECT_RECENT_QUERY_EMBEDDINGS, (QUERY_CACHE_SIZE,))
+        return {row['hash']: row['embedding'] for row in cursor.fetchall()}
+
+    def _save_query_embeddings_sync(self, entries: Dict[str, np.ndarray]):
+        """Persist query embeddings, keeping only the most recent QUERY_CACHE_PERSIST_ROWS"""
+        try:
+            with self.connection:
+                self.connection.executemany(SQL_INSERT_QUERY_EMBEDDING, [
+                    (key, embedding.astype(np.float32)) for key, embedding in entries.items()
+                ])
+                self.connection.execute(SQL_TRIM_QUERY_EMBEDDINGS, (QUERY_CACHE_PERSIST_ROWS,))
+        except sqlite3.Error as e:
+            # Only a cache; the embeddings are regenerated on the next miss
+            logger.error(f"Error saving {len(entries)} query embeddings: {str(e)}")
+
+    def _invalidate_embedding_matrix(self):
+        """Drop the in-memory embedding matrix so the next search reloads it"""
+        self._emb_matrix = None
+        self._emb_matrix_gpu = None
+
+    def _load_embedding_matrix_sync(self):
+        """Build the embedding matrix and its tile bounds if it is stale"""
+        if self._emb_matrix is not None:
+            return
+
+        # Nothing else writes through this connection, so the count matches the SELECT below
+        total = self._count_rows("SELECT COUNT(*) as count FROM document_chunks", self.connection)
+
+        # Only ids and embeddings are needed to rank; content and file metadata
+        # are fetched afterwards for the winning chunks alone
+        cursor = self.connection.execute(SQL_SELECT_EMBEDDINGS)
+        cursor.arraysize = EMBEDDING_FETCH_ROWS
+
+        # Stream rows into a preallocated matrix so only one batch of rows is held at a time
+        matrix = np.empty((0, 0), dtype=np.float32)
+        chunk_ids = np.empty(total, dtype=np.int64)
+        dimension_bytes = None
+        filled = 0
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+
+            if dimension_bytes is None:
+                # Size the matrix from the first real embedding; a NULL row says nothing about it
+                first = next((row['embedding'] for row in rows if row['embedding']), None)
+                if first is not None:
+                    dimension_bytes = len(first)
+                    dimension = dimension_bytes // np.dtype(EMBEDDING_DTYPE).itemsize
+                    matrix = np.empty((total, dimension), dtype=np.float32)
+
+            valid = []
+            for row in rows:
+                if not row['embedding'] or len(row['embedding']) != dimension_bytes:
+                    logger.error(f"Skipping chunk {row['id']} with missing or mismatched embedding")
+                    continue
+                valid.append(row)
+
+            if not valid:
+                continue
+
+            count = len(valid)
+            matrix[filled:filled + count] = self._decode_embedding(
+                b"".join(row['embedding'] for row in valid)
+            ).reshape(count, -1)
+            chunk_ids[filled:filled + count] = [row['id'] for row in valid]
+            filled += count
+
+        # Rows are stored unit length, so the matrix is used as loaded
+        matrix = matrix[:filled]
+        self._set_embedding_matrix(chunk_ids[:filled], matrix)
+        logger.info(f"Loaded {len(matrix)} embeddings into memory ({len(self._tile_starts)} tiles)")
 
-            rows = cursor.fetchall()
-            logger.info(f"Searching through {len(rows)} document chunks")
+    def _append_to_embedding_matrix(self, chunk_ids: List[int], embeddings: List[np.ndarray]):
+        """Add freshly inserted chunks to the in-memory matrix, if it is loaded"""
+        if self._emb_matrix is None or not chunk_ids:
+            return
 
-            if len(rows) == 0:
+        new_rows = np.stack(embeddings)
+        old_count = len(self._emb_matrix)
+        if old_count == 0:
+            self._set_embedding_matrix(np.array(chunk_ids, dtype=np.int64), new_rows)
+            return
+
+        if new_rows.shape[1] != self._emb_matrix.shape[1]:
+            # Let the next search reload and skip the mismatched rows
+            self._invalidate_embedding_matrix()
+            return
+
+        # Tiles before the last partially filled one are unchanged
+        self._set_embedding_matrix(
+            np.concatenate([self._chunk_ids, np.array(chunk_ids, dtype=np.int64)]),
+            np.vstack([self._emb_matrix, new_rows]),
+            first_dirty_tile=old_count // EMBEDDING_TILE_ROWS
+        )
+
+    def _set_embedding_matrix(self, chunk_ids: np.ndarray, matrix: np.ndarray, first_dirty_tile: int = 0):
+        """Install a unit-row embedding matrix and recompute tile bounds from first_dirty_tile on"""
+        # Per tile: centroid c and radius r = max |x - c|. For a unit query q,
+        # q.x = q.c + q.(x - c) <= q.c + r, which bounds every similarity in the tile
+        tile_starts = np.arange(0, len(matrix), EMBEDDING_TILE_ROWS)
+        dirty_starts = tile_starts[first_dirty_tile:]
+
+        if len(dirty_starts):
+            offset = dirty_starts[0]
+            part = matrix[offset:]
+            local_starts = dirty_starts - offset
+            tile_sizes = np.diff(np.append(local_starts, len(part)))
+            centroids = np.add.reduceat(part, local_starts, axis=0) / tile_sizes[:, None]
+            distances = np.linalg.norm(part - np.repeat(centroids, tile_sizes, axis=0), axis=1)
+            radii = np.maximum.reduceat(distances, local_starts)
+        else:
+            centroids = np.empty((0, matrix.shape[1]), dtype=np.float32)
+            radii = np.empty(0, dtype=np.float32)
+
+        if first_dirty_tile:
+            centroids = np.vstack([self._tile_centroids[:first_dirty_tile], centroids])
+            radii = np.concatenate([self._tile_radii[:first_dirty_tile], radii])
+
+        self._chunk_ids = chunk_ids
+        self._tile_starts = tile_starts
+        self._tile_centroids = centroids.astype(np.float32)
+        self._tile_radii = radii.astype(np.float32)
+        self._emb_matrix = matrix
+        self._emb_matrix_gpu = None
+
+    @staticmethod
+    def _encode_embedding(embedding: np.ndarray) -> np.ndarray:
+        """Scale an embedding to unit length in the on-disk dtype; the sqlite3 adapter binds it as a BLOB"""
+        norm = np.linalg.norm(embedding)
+        return (embedding / norm if norm > 0 else embedding).astype(EMBEDDING_DTYPE)
+
+    @staticmethod
+    def _decode_embedding(blob: bytes) -> np.ndarray:
+        """Deserialize stored embedding bytes into a float32 vector"""
+        return np.frombuffer(blob, dtype=EMBEDDING_DTYPE).astype(np.float32)
+
+    def _get_folder_chunk_ids(self, folder_id: int) -> np.ndarray:
+        """Return the ids of all chunks belonging to files in a folder"""
+        cursor = self._read_connection().execute(SQL_SELECT_FOLDER_CHUNK_IDS, (folder_id,))
+        return np.array([row['id'] for row in cursor.fetchall()], dtype=np.int64)
+
+    def _rank_embeddings_sync(self, query_embedding: np.ndarray, limit: int, threshold: float,
+                              chunk_scope: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        try:
+            matrix = self._emb_matrix
+            logger.info(f"Searching through {len(matrix)} document chunks")
+
+            if len(matrix) == 0:
                 logger.warning("No document chunks found in database")
                 return []
 
-            similarities_calculated = 0
+            query_embedding_norm = np.linalg.norm(query_embedding)
+            query_unit = (query_embedding / (query_embedding_norm or 1.0)).astype(np.float32)
 
-            for row in rows:
-                try:
-                    # Convert bytes back to numpy array
-                    stored_embedding = np.frombuffer(row['embedding'], dtype=np.float32)
+            if chunk_scope is not None:
+                # Only score the rows of the requested folder
+                rows = np.nonzero(np.isin(self._chunk_ids, chunk_scope))[0]
+                similarities = np.full(len(matrix), -np.inf, dtype=np.float32)
+                similarities[rows] = matrix[rows] @ query_unit
+                similarities_calculated = len(rows)
+            else:
+                # Skip tiles whose upper bound is under the threshold
+                bounds = self._tile_centroids @ query_unit + self._tile_radii
+                live_tiles = np.nonzero(bounds >= threshold)[0]
 
-                    # Calculate cosine similarity
-                    similarity = np.dot(query_embedding, stored_embedding) / (
-                            query_embedding_norm * np.linalg.norm(stored_embedding)
-                    )
+                if len(live_tiles) == len(self._tile_starts):
+                    similarities = matrix @ query_unit
+                else:
+                    similarities = np.full(len(matrix), -np.inf, dtype=np.float32)
+                    for tile in live_tiles:
+                        start = self._tile_starts[tile]
+                        end = start + EMBEDDING_TILE_ROWS
+                        similarities[start:end] = matrix[start:end] @ query_unit
 
-                    similarities_calculated += 1
+                similarities_calculated = min(len(live_tiles) * EMBEDDING_TILE_ROWS, len(matrix))
+                logger.debug(f"Pruned {len(self._tile_starts) - len(live_tiles)} of {len(self._tile_starts)} tiles")
 
-                    if similarity >= threshold:
-                        results.append({
-                            'content': row['content'],
-                            'file_path': row['file_path'],
-                            'file_name': row['file_name'],
-                            'file_type': row['file_type'],
-                            'last_modified': row['last_modified'],
-                            'similarity_score': float(similarity)
-                        })
+            top_indices = self._select_top_k(similarities, limit, threshold)
+            ranked = [(int(self._chunk_ids[i]), float(similarities[i])) for i in top_indices]
 
-                        logger.debug(f"Match found: {row['file_name']} (similarity: {similarity:.3f})")
+            logger.info(f"Search completed: {similarities_calculated} similarities calculated, {len(ranked)} results returned")
 
-                except Exception as e:
-                    logger.error(f"Error processing search result: {str(e)}")
-                    continue
+            if len(ranked) == 0:
+                logger.warning(f"No results found above threshold {threshold}")
+                # Log the best scores this scan did compute, for debugging; pruned rows are -inf
+                sample_similarities = [round(float(similarities[i]), 3) for i in self._select_top_k(similarities, 3, -1.0)]
+                logger.info(f"Sample similarities: {sample_similarities}")
+
+            return ranked
+
+        except Exception as e:
+            logger.error(f"Search error: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            raise
+
+    async def search_batch(self, queries: List[str], limit: int = 10, threshold: float = 0.3) -> List[List[Dict[str, Any]]]:
+        """Search for several queries at once; returns one result list per query, in order"""
+        if not queries:
+            return []
+
+        try:
+            logger.info(f"Starting batch search for {len(queries)} queries (threshold: {threshold}, limit: {limit})")
+
+            query_embeddings, _ = await asyncio.gather(
+                self._embed_queries(queries),
+                self._run(self._load_embedding_matrix_sync)
+            )
+
+        except Exception as e:
+            logger.error(f"Batch search error: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            raise
+
+        ranked_lists = await self._run(self._search_batch_sync, np.stack(query_embeddings), limit, threshold)
+        # Fetch the details for each query in parallel on the reader pool
+        return list(await asyncio.gather(*(self._run_read(self._build_results, ranked) for ranked in ranked_lists)))
+
+    def _search_batch_sync(self, query_embeddings: np.ndarray, limit: int, threshold: float) -> List[List[Tuple[int, float]]]:
+        try:
+            matrix = self._emb_matrix
+            if len(matrix) == 0 or limit <= 0:
+                return [[] for _ in query_embeddings]
+
+            norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+            query_units = (query_embeddings / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+
+            top_indices, top_scores = self._batch_top_k(query_units, min(limit, len(matrix)))
+
+            ranked_lists = []
+            for indices, scores in zip(top_indices, top_scores):
+                ranked_lists.append([
+                    (int(self._chunk_ids[i]), float(score))
+                    for i, score in zip(indices, scores)
+                    if score >= threshold
+                ])
+
+            logger.info(f"Batch search completed: {sum(len(r) for r in ranked_lists)} results for {len(ranked_lists)} queries")
+            return ranked_lists
+
+        except Exception as e:
+            logger.error(f"Batch search error: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            raise
 
-            # Sort by similarity score and return top results
-            results.sort(key=lambda x: x['similarity_score'], reverse=True)
+    def _batch_top_k(self, query_units: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Score every query against every chunk and return the k best (indices, scores) per query"""
+        device = self._resolve_gpu_device()
+        if device is not None:
+            import torch
 
-            logger.info(f"Search completed: {similarities_calculated} similarities calculated, {len(results)} results above threshold")
+            # Upload the matrix once and keep it on the device until the next write
+            if self._emb_matrix_gpu is None:
+                self._emb_matrix_gpu = torch.as_tensor(self._emb_matrix, device=device)
+
+            similarities = torch.as_tensor(query_units, device=device) @ self._emb_matrix_gpu.T
+            scores, indices = similarities.topk(k, dim=1)
+            return indices.cpu().numpy(), scores.cpu().numpy()
+
+        similarities = query_units @ self._emb_matrix.T
+        indices = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(similarities, indices, axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')
+        return np.take_along_axis(indices, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+    def _resolve_gpu_device(self) -> Optional[str]:
+        """Return 'cuda' or 'mps' when torch can use a GPU, otherwise None"""
+        if not self._gpu_checked:
+            self._gpu_checked = True
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    self._gpu_device = "cuda"
+                elif getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
+                    self._gpu_device = "mps"
+            except ImportError:
+                pass
+            logger.info(f"Batch search device: {self._gpu_device or 'cpu'}")
+
+        return self._gpu_device
+
+    def _search_vector_index(self, query_embedding: np.ndarray, limit: int, threshold: float,
+                             folder_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Run the KNN search inside sqlite-vec and attach chunk details to the hits"""
+        try:
+            params = (query_embedding.astype(np.float32), limit)
+            if folder_id is None:
+                cursor = self._read_connection().execute(SQL_SEARCH_VEC, params)
+            else:
+                cursor = self._read_connection().execute(SQL_SEARCH_VEC_IN_FOLDER, params + (folder_id,))
+
+            # vec0 reports cosine distance; convert back to similarity for the threshold
+            ranked = []
+            for row in cursor.fetchall():
+                similarity = 1.0 - row['distance']
+                if similarity >= threshold:
+                    ranked.append((row['id'], similarity))
+
+            results = self._build_results(ranked)
+            logger.info(f"sqlite-vec search completed: {len(results)} results returned")
 
             if len(results) == 0:
                 logger.warning(f"No results found above threshold {threshold}")
-                # Log some sample similarities for debugging
-                sample_similarities = []
-                cursor.execute("SELECT content FROM document_chunks LIMIT 3")
-                sample_rows = cursor.fetchall()
-                for row in sample_rows:
-                    try:
-                        stored_embedding = np.frombuffer(row['embedding'], dtype=np.float32)
-                        similarity = np.dot(query_embedding, stored_embedding) / (
-                                query_embedding_norm * np.linalg.norm(stored_embedding)
-                        )
-                        sample_similarities.append(similarity)
-                    except:
-                        pass
-                logger.info(f"Sample similarities: {sample_similarities}")
 
-            return results[:limit]
+            return results
 
         except Exception as e:
             logger.error(f"Search error: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise
 
+    def _build_results(self, ranked: List[tuple]) -> List[Dict[str, Any]]:
+        """Turn ranked (chunk_id, similarity) pairs into search results, keeping their order"""
+        details = self._fetch_chunk_details([chunk_id for chunk_id, _ in ranked])
+
+        results = []
+        for chunk_id, similarity in ranked:
+            row = details.get(chunk_id)
+            if row is None:
+                continue
+            results.append({
+                'content': row['content'],
+                'file_path': row['file_path'],
+                'file_name': row['file_name'],
+                'file_type': row['file_type'],
+                'last_modified': row['last_modified'],
+                'similarity_score': similarity
+            })
+            logger.debug(f"Match found: {row['file_name']} (similarity: {similarity:.3f})")
+
+        return results
+
+    def _fetch_chunk_details(self, chunk_ids: List[int]) -> Dict[int, sqlite3.Row]:
+        """Fetch content and file metadata for the given chunk ids in a single query"""
+        if not chunk_ids:
+            return {}
+
+        placeholders = ",".join("?" * len(chunk_ids))
+        cursor = self._read_connection().execute(SQL_SELECT_CHUNK_DETAILS.format(placeholders=placeholders), chunk_ids)
+        return {row['id']: row for row in cursor.fetchall()}
+
+    @staticmethod
+    def _select_top_k(similarities: np.ndarray, limit: int, threshold: float) -> np.ndarray:
+        """Return indices of the best `limit` scores at or above threshold, highest first"""
+        candidates = np.nonzero(similarities >= threshold)[0]
+        if candidates.size > limit:
+            # argpartition finds the top `limit` in O(N); only those get fully sorted
+            top = np.argpartition(-similarities[candidates], limit)[:limit]
+            candidates = candidates[top]
+        return candidates[np.argsort(-similarities[candidates], kind='stable')]
+
     async def get_indexed_files(self) -> List[Dict[str, Any]]:
         """Get list of all indexed files"""
-        cursor = self.connection.cursor()
+        return await self._run_read(self._get_indexed_files_sync)
+
+    def _get_indexed_files_sync(self) -> List[Dict[str, Any]]:
         try:
-            cursor.execute("""
-                SELECT 
-                    f.id,
-                    f.file_path,
-                    f.file_name,
-                    f.file_type,
-                    f.file_size,
-                    f.last_modified,
-                    fo.path as folder_path,
-                    COUNT(dc.id) as chunk_count
-                FROM files f
-                JOIN folders fo ON f.folder_id = fo.id
-                LEFT JOIN document_chunks dc ON f.id = dc.file_id
-                GROUP BY f.id, f.file_path, f.file_name, f.file_type, f.file_size, f.last_modified, fo.path
-                ORDER BY f.file_name
-            """)
+            cursor = self._read_connection().execute(SQL_SELECT_INDEXED_FILES)
 
             files = [
                 {
@@ -343,19 +1279,11 @@ class VectorStore:
 
     async def get_indexed_folders(self) -> List[Dict[str, Any]]:
         """Get list of indexed folders"""
-        cursor = self.connection.cursor()
+        return await self._run_read(self._get_indexed_folders_sync)
+
+    def _get_indexed_folders_sync(self) -> List[Dict[str, Any]]:
         try:
-            cursor.execute("""
-                SELECT 
-                    f.id,
-                    f.path,
-                    f.last_indexed,
-                    COUNT(files.id) as file_count
-                FROM folders f
-                LEFT JOIN files ON f.id = files.folder_id
-                GROUP BY f.id, f.path, f.last_indexed
-                ORDER BY f.last_indexed DESC
-            """)
+            cursor = self._read_connection().execute(SQL_SELECT_INDEXED_FOLDERS)
 
             folders = [
                 {
@@ -376,16 +1304,18 @@ class VectorStore:
 
     async def remove_folder(self, folder_id: int):
         """Remove a folder and all its associated data"""
-        cursor = self.connection.cursor()
+        await self._run(self._remove_folder_sync, folder_id)
+
+    def _remove_folder_sync(self, folder_id: int):
         try:
             # Get folder info before deletion
-            cursor.execute("SELECT path FROM folders WHERE id = ?", (folder_id,))
-            folder = cursor.fetchone()
+            folder = self.connection.execute("SELECT path FROM folders WHERE id = ?", (folder_id,)).fetchone()
 
             if folder:
                 logger.info(f"Removing folder: {folder['path']} (ID: {folder_id})")
-                cursor.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+                self.connection.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
                 self.connection.commit()
+                self._invalidate_embedding_matrix()
                 logger.info(f"Folder and all associated files/chunks removed successfully")
             else:
                 logger.warning(f"Folder with ID {folder_id} not found")
@@ -396,13 +1326,23 @@ class VectorStore:
 
     async def clear_all(self):
         """Clear all data from the database"""
-        cursor = self.connection.cursor()
+        await self._run(self._clear_all_sync)
+
+    def _clear_all_sync(self):
         try:
             logger.info("Clearing all data from database...")
-            cursor.execute("DELETE FROM document_chunks")
-            cursor.execute("DELETE FROM files")
-            cursor.execute("DELETE FROM folders")
-            self.connection.commit()
+            # Empty the vector index in bulk rather than row by row through the cleanup trigger
+            vec_cleanup = "DELETE FROM vec_chunks;" if self._vec_table_exists else ""
+            # executescript runs the grouped deletes in a single call on the worker thread
+            self.connection.executescript(f"""
+                BEGIN;
+                {vec_cleanup}
+                DELETE FROM document_chunks;
+                DELETE FROM files;
+                DELETE FROM folders;
+                COMMIT;
+            """)
+            self._invalidate_embedding_matrix()
             logger.info("All data cleared from database")
         except Exception as e:
             logger.error(f"Error clearing database: {str(e)}")
@@ -410,6 +1350,19 @@ class VectorStore:
 
     def close(self):
         """Close the database connection"""
+        if self._flush_task:
+            self._flush_task.cancel()
+        # Let queued queries finish before the connections go away
+        self._read_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        with self._read_connections_lock:
+            for connection in self._read_connections:
+                connection.close()
+            self._read_connections = []
         if self.connection:
+            self._flush_pending_sync()
+            if self._unsaved_queries:
+                self._save_query_embeddings_sync(self._unsaved_queries)
+                self._unsaved_queries = {}
             self.connection.close()
             logger.info("Database connection closed")
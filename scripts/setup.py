@@ -3,52 +3,455 @@
 Setup script for SmartFile AI backend dependencies
 """
 
+import asyncio
+import hashlib
+import importlib
+import importlib.metadata
+import logging
+import queue
+import random
+import re
 import subprocess
 import sys
 import os
+import pathlib
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger('setup')
+
+# Resolved once so the script also works when invoked through a symlink
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+REQUIREMENTS_PATH = PROJECT_ROOT / 'backend' / 'requirements.txt'
+LOCK_PATH = PROJECT_ROOT / 'backend' / 'requirements.lock'
+
+# Wheels fetched by the parallel download step, reused by the install that follows
+WHEEL_CACHE_DIR = PROJECT_ROOT / '.wheel_cache'
+
+# Persistent pip HTTP and wheel cache, kept next to the project so CI can cache it
+PIP_CACHE_DIR = PROJECT_ROOT / '.pip-cache'
+
+# Requirements the model prefetch needs (huggingface_hub comes with sentence-transformers);
+# installed ahead of the rest so the download can overlap the remaining install
+PREFETCH_REQUIREMENTS = {'sentence-transformers', 'hf-transfer'}
+
+# Whole-step retries on top of pip's own per-request retries
+RETRY_ATTEMPTS = 5
+RETRY_MAX_DELAY = 30
+
+# Fingerprint of the last requirements file that installed cleanly
+SETUP_CACHE_DIR = PROJECT_ROOT / '.setup_cache'
+REQUIREMENTS_HASH_FILE = SETUP_CACHE_DIR / 'req.sha256'
+
+# Embedding model used by backend/services/embedding_service.py
+MODEL_NAME = 'all-MiniLM-L6-v2'
+MODEL_REPO_ID = f'sentence-transformers/{MODEL_NAME}'
+# Files sentence-transformers needs; the repo also carries ONNX and OpenVINO exports we never load
+MODEL_ALLOW_PATTERNS = ['*.json', '*.txt', '*.safetensors']
+MODEL_IGNORE_PATTERNS = ['onnx/*', 'openvino/*']
+MODEL_DOWNLOAD_WORKERS = 8
+# Either one means the weights finished downloading
+MODEL_WEIGHT_FILES = ('model.safetensors', 'pytorch_model.bin')
+
+class StripEmojiFilter(logging.Filter):
+    """Drop the leading status emoji for consoles that cannot encode it"""
+
+    def filter(self, record):
+        record.msg = re.sub(r'^[^\w\s]+\s*', '', str(record.msg))
+        return True
+
+def configure_logging():
+    """Route setup messages through a queue so worker threads never wait on stdout"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    # Windows consoles with a legacy code page raise UnicodeEncodeError on emoji
+    if not (sys.stdout.encoding or '').lower().startswith('utf'):
+        handler.addFilter(StripEmojiFilter())
+
+    log_queue = queue.Queue()
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+def run_pip(args):
+    """Run a pip command in this interpreter and return True on success"""
+    try:
+        from pip._internal.cli.main import main as pip_main
+    except ImportError:
+        # pip internals moved or are unavailable; fall back to a child process
+        return subprocess.run([sys.executable, '-m', 'pip', *args]).returncode == 0
 
-def install_requirements():
-    """Install Python requirements"""
-    requirements_file = os.path.join(os.path.dirname(__file__), '..', 'backend', 'requirements.txt')
-    
     try:
+        rc = pip_main(list(args))
+    except SystemExit as e:
+        rc = e.code
+    return rc in (0, None)
+
+def retry(func, attempts=RETRY_ATTEMPTS):
+    """Call func until it returns True, backing off with jitter between attempts"""
+    for attempt in range(attempts):
+        try:
+            if func():
+                return True
+        except (subprocess.CalledProcessError, OSError) as e:
+            # e.g. a pip child process that failed, or a cache directory that could not be written
+            logger.warning(f"⚠️ Attempt {attempt + 1}/{attempts} raised {type(e).__name__}: {e}")
+        if attempt < attempts - 1:
+            delay = min(RETRY_MAX_DELAY, 2 ** attempt) + random.random()
+            logger.warning(f"🔁 Attempt {attempt + 1}/{attempts} failed, retrying in {delay:.1f}s")
+            time.sleep(delay)
+    return False
+
+def requirements_hash(requirements_file):
+    """Return the SHA-256 hex digest of a requirements file and the interpreter it targets"""
+    digest = hashlib.sha256()
+    # A recreated venv or another interpreter starts empty even if requirements.txt is unchanged
+    for part in (sys.executable, sys.prefix):
+        digest.update(part.encode('utf-8') + b'\0')
+    with open(requirements_file, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+def requirements_installed(requirements_file):
+    """Check that every requirement is installed, at its pinned version where there is one"""
+    for requirement in read_requirements(requirements_file):
+        try:
+            installed = importlib.metadata.version(requirement_name(requirement))
+        except importlib.metadata.PackageNotFoundError:
+            return False
+        pinned = requirement.split('==', 1)[1].split(';', 1)[0].strip() if '==' in requirement else None
+        if pinned is not None and installed != pinned:
+            return False
+    return True
+
+def requirements_recorded(digest, requirements_file):
+    """Check the recorded fingerprint and installed versions, without importing pip"""
+    try:
+        with open(REQUIREMENTS_HASH_FILE) as f:
+            if f.read().strip() != digest:
+                return False
+    except OSError:
+        return False
+
+    return requirements_installed(requirements_file)
+
+def requirements_up_to_date(digest, requirements_file):
+    """Check whether the requirements were already installed and are still consistent"""
+    if not requirements_recorded(digest, requirements_file):
+        return False
+
+    # pip check only inspects installed metadata, so it is fast and needs no network
+    return run_pip(['check'])
+
+def save_requirements_hash(digest):
+    """Record the fingerprint of a successful install"""
+    os.makedirs(SETUP_CACHE_DIR, exist_ok=True)
+    tmp_file = REQUIREMENTS_HASH_FILE.with_name(REQUIREMENTS_HASH_FILE.name + '.tmp')
+    with open(tmp_file, 'w') as f:
+        f.write(digest)
+    os.replace(tmp_file, REQUIREMENTS_HASH_FILE)
+
+def regenerate_lock(requirements_file, lock_file):
+    """Pin every dependency with hashes into lock_file using pip-tools, when it is installed"""
+    try:
+        from piptools.scripts.compile import cli as pip_compile
+    except ImportError:
+        return False
+
+    try:
+        pip_compile.main([
+            '--quiet', '--generate-hashes', '--output-file', str(lock_file), str(requirements_file)
+        ], standalone_mode=False)
+        logger.info("🔒 Regenerated requirements.lock")
+        return True
+    except (Exception, SystemExit) as e:
+        logger.warning(f"⚠️ Could not regenerate requirements.lock ({e})")
+        return False
+
+def lock_is_fresh(requirements_file, lock_file):
+    """Check that the lockfile exists and was written after the last requirements edit"""
+    return (
+        os.path.isfile(lock_file)
+        and os.path.getmtime(lock_file) >= os.path.getmtime(requirements_file)
+    )
+
+def read_requirements(requirements_file):
+    """Return the requirement specifiers listed in a requirements file"""
+    requirements = []
+    with open(requirements_file) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            # Options such as -r or --index-url only make sense for the full install
+            if line and not line.startswith('-'):
+                requirements.append(line)
+    return requirements
+
+def requirement_name(requirement):
+    """Return the normalized project name of a requirement specifier"""
+    return re.split(r'[\s\[<>=!~;@]', requirement, 1)[0].lower().replace('_', '-')
+
+def configure_pip_environment():
+    """Point every pip invocation, in-process or not, at the shared cache and retry settings"""
+    os.environ.setdefault('PIP_CACHE_DIR', str(PIP_CACHE_DIR))
+    # Let pip retry individual requests on a flaky mirror before the whole step fails
+    os.environ.setdefault('PIP_RETRIES', '5')
+    os.environ.setdefault('PIP_TIMEOUT', '30')
+
+def download_wheels(requirements):
+    """Download every requirement into WHEEL_CACHE_DIR, several at a time"""
+    workers = int(os.environ.get("PIP_PARALLEL_DOWNLOADS", 5))
+
+    # Downloads stay in child processes: pip's in-process entry point keeps global
+    # state and is not safe to call from several threads at once
+    def download(requirement):
         subprocess.check_call([
-            sys.executable, '-m', 'pip', 'install', '-r', requirements_file
+            sys.executable, '-m', 'pip', 'download', '-q', '--no-deps', '--prefer-binary',
+            '--dest', WHEEL_CACHE_DIR, requirement
         ])
-        print("✅ Python dependencies installed successfully")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(download, requirement): requirement for requirement in requirements}
+        for future in as_completed(futures):
+            future.result()
+            logger.info(f"⬇️  Downloaded {futures[future]}")
+
+def install_requirements():
+    """Install Python requirements"""
+    requirements_file = str(REQUIREMENTS_PATH)
+    lock_file = str(LOCK_PATH)
+    digest = requirements_hash(requirements_file)
+
+    configure_pip_environment()
+
+    if requirements_up_to_date(digest, requirements_file):
+        logger.info("✅ Python dependencies already up to date")
+        return True
+
+    install_options = ['--prefer-binary']
+    if os.environ.get('NO_BUILD_ISOLATION') == '1':
+        # Build sdists against the setuptools/wheel from upgrade_build_tools instead of a fresh
+        # isolated build env per package. Wheels are unaffected; opt-in because an sdist
+        # with other build requirements will then fail to build
+        install_options.append('--no-build-isolation')
+
+    if lock_is_fresh(requirements_file, lock_file):
+        # Every package is pinned and hashed, so pip has nothing to resolve and the
+        # cached wheels can be used as they are
+        if run_pip(['install', *install_options, '--require-hashes', '--no-deps', '-r', lock_file]):
+            save_requirements_hash(digest)
+            logger.info("✅ Python dependencies installed successfully")
+            return True
+        logger.warning("⚠️ Install from requirements.lock failed, falling back to requirements.txt")
+
+    try:
+        # Fetch the top-level packages concurrently, then install from the local copies;
+        # pip still resolves and downloads their dependencies itself
+        download_wheels(read_requirements(requirements_file))
+        if run_pip(['install', *install_options, '--find-links', str(WHEEL_CACHE_DIR), '-r', requirements_file]):
+            save_requirements_hash(digest)
+            logger.info("✅ Python dependencies installed successfully")
+            return True
+        logger.warning("⚠️ Parallel install failed, retrying with a plain pip install")
     except subprocess.CalledProcessError as e:
-        print(f"❌ Error installing Python dependencies: {e}")
+        logger.warning(f"⚠️ Parallel download failed ({e}), retrying with a plain pip install")
+
+    if not run_pip(['install', *install_options, '-r', requirements_file]):
+        logger.error("❌ Error installing Python dependencies")
         return False
-    
+
+    save_requirements_hash(digest)
+    logger.info("✅ Python dependencies installed successfully")
     return True
 
+def upgrade_build_tools():
+    """Upgrade pip, wheel and setuptools before the first install"""
+    try:
+        # Make sure sdists build through bdist_wheel so the built wheels land in the pip cache.
+        # This may replace pip itself, so it runs in a child process and before anything
+        # imports pip._internal in-process; modules already loaded would not match the new files
+        subprocess.check_call([
+            sys.executable, '-m', 'pip', 'install', '-q', '--upgrade', 'pip', 'wheel', 'setuptools'
+        ])
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"⚠️ Could not upgrade pip, wheel and setuptools ({e}), continuing")
+
+def install_prefetch_requirements():
+    """Install just what the model prefetch needs, unless huggingface_hub is already there"""
+    try:
+        import huggingface_hub  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    configure_pip_environment()
+    requirements = [
+        requirement for requirement in read_requirements(REQUIREMENTS_PATH)
+        if requirement_name(requirement) in PREFETCH_REQUIREMENTS
+    ]
+    if requirements and run_pip(['install', '--prefer-binary', *requirements]):
+        # Let the import system see the packages pip just added to site-packages
+        importlib.invalidate_caches()
+    else:
+        logger.warning("⚠️ Could not install the model download requirements early, skipping prefetch")
+
+def enable_hf_transfer():
+    """Switch huggingface_hub to the multi-connection hf_transfer downloader when it is installed"""
+    # Must run before huggingface_hub is imported, which reads the flag once
+    try:
+        import hf_transfer  # noqa: F401
+    except ImportError:
+        return
+    os.environ.setdefault('HF_HUB_ENABLE_HF_TRANSFER', '1')
+
+def limit_cpu_threads():
+    """Cap the BLAS/OpenMP thread pools before torch is imported"""
+    # torch sizes its pools from these at import time and otherwise takes every core
+    threads = str(max(1, (os.cpu_count() or 2) // 2))
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ.setdefault(var, threads)
+    # Silences the tokenizers fork warning and keeps it from starting its own pool
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+def model_dir():
+    """Return the directory EmbeddingService loads the model from"""
+    # Same lookup as SentenceTransformer.__init__ in 2.2.x (pinned in requirements.txt),
+    # which only checks this flat folder, not the huggingface_hub cache
+    st_home = os.environ.get('SENTENCE_TRANSFORMERS_HOME')
+    if st_home is None:
+        torch_home = os.getenv('TORCH_HOME', os.path.join(os.getenv('XDG_CACHE_HOME', '~/.cache'), 'torch'))
+        st_home = os.path.join(os.path.expanduser(torch_home), 'sentence_transformers')
+    return os.path.join(st_home, MODEL_REPO_ID.replace('/', '_'))
+
+def cached_model_path():
+    """Return the model directory if a usable copy has already been downloaded there"""
+    path = model_dir()
+    # Files land one by one as they finish, so an interrupted download can leave
+    # modules.json behind without the weights
+    if not os.path.isfile(os.path.join(path, 'modules.json')):
+        return None
+    if not any(os.path.isfile(os.path.join(path, weights)) for weights in MODEL_WEIGHT_FILES):
+        return None
+    return path
+
+def model_cached():
+    """Check whether the embedding model is already on disk"""
+    return cached_model_path() is not None
+
+def snapshot_model():
+    """Download every model file concurrently into model_dir() and return that path"""
+    from huggingface_hub import snapshot_download
+
+    allow_patterns = list(MODEL_ALLOW_PATTERNS)
+    try:
+        # safetensors weights are memory-mapped instead of unpickled by torch.load
+        import safetensors  # noqa: F401
+    except ImportError:
+        # Without it transformers can only read pytorch_model.bin
+        allow_patterns.append('*.bin')
+
+    return snapshot_download(
+        MODEL_REPO_ID,
+        local_dir=model_dir(),
+        max_workers=MODEL_DOWNLOAD_WORKERS,
+        allow_patterns=allow_patterns,
+        ignore_patterns=MODEL_IGNORE_PATTERNS
+    )
+
+def load_model():
+    """Download the embedding model and load it from its local copy"""
+    import sentence_transformers
+
+    # Loading from a directory keeps sentence-transformers from making its own requests
+    return sentence_transformers.SentenceTransformer(snapshot_model())
+
 def download_models():
     """Download required ML models"""
+    # A usable copy on disk means there is nothing to do; avoid importing torch just to confirm it
+    if model_cached():
+        logger.info("✅ Embedding model already downloaded")
+        return True
+    enable_hf_transfer()
+    limit_cpu_threads()
+
     try:
-        import sentence_transformers
-        
         # Download the embedding model
-        model = sentence_transformers.SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ Embedding model downloaded successfully")
+        model = load_model()
+        logger.info("✅ Embedding model downloaded successfully")
         
         return True
     except Exception as e:
-        print(f"❌ Error downloading models: {e}")
+        logger.error(f"❌ Error downloading models: {e}")
         return False
 
+async def prefetch_model():
+    """Download the model into its local directory while pip is still running"""
+    enable_hf_transfer()
+    try:
+        # Installed by install_prefetch_requirements, or by an earlier run
+        import huggingface_hub  # noqa: F401
+    except ImportError:
+        return
+
+    if model_cached():
+        return
+
+    try:
+        await asyncio.to_thread(snapshot_model)
+        logger.info("⬇️  Prefetched embedding model")
+    except Exception as e:
+        logger.warning(f"⚠️ Model prefetch failed ({e}), it will be downloaded after install")
+
+async def install_and_prefetch():
+    """Install requirements and prefetch the model concurrently"""
+    loop = asyncio.get_running_loop()
+    configure_pip_environment()
+    # Skipped on warm runs; the check here deliberately avoids run_pip, which would load pip
+    if not requirements_recorded(requirements_hash(REQUIREMENTS_PATH), REQUIREMENTS_PATH):
+        await loop.run_in_executor(None, upgrade_build_tools)
+    # One-off steps stay outside the retried install; regenerating imports pip in-process,
+    # so it has to come after the upgrade
+    if not lock_is_fresh(REQUIREMENTS_PATH, LOCK_PATH):
+        await loop.run_in_executor(None, regenerate_lock, REQUIREMENTS_PATH, LOCK_PATH)
+
+    # On a first install huggingface_hub is missing; fetch it (with sentence-transformers)
+    # first so the model download can run alongside the rest of the install
+    await loop.run_in_executor(None, install_prefetch_requirements)
+    installed, _ = await asyncio.gather(
+        loop.run_in_executor(None, retry, install_requirements),
+        prefetch_model()
+    )
+    return installed
+
 def main():
-    print("🚀 Setting up SmartFile AI...")
+    listener = configure_logging()
+    try:
+        run_setup()
+    finally:
+        # Flush everything still queued, including on the sys.exit(1) paths
+        listener.stop()
+
+def run_setup():
+    logger.info("🚀 Setting up SmartFile AI...")
     
-    if not install_requirements():
+    if not REQUIREMENTS_PATH.is_file():
+        logger.error(f"❌ Requirements file not found: {REQUIREMENTS_PATH}")
+        sys.exit(1)
+
+    if not asyncio.run(install_and_prefetch()):
         sys.exit(1)
     
-    if not download_models():
+    if not retry(download_models):
         sys.exit(1)
     
-    print("✅ Setup completed successfully!")
-    print("\nNext steps:")
-    print("1. Run 'npm install' to install frontend dependencies")
-    print("2. Run 'npm run electron-dev' to start the application")
+    logger.info("✅ Setup completed successfully!")
+    logger.info("Next steps:")
+    logger.info("1. Run 'npm install' to install frontend dependencies")
+    logger.info("2. Run 'npm run electron-dev' to start the application")
 
 if __name__ == "__main__":
     main()